@@ -5,9 +5,17 @@ import sys
 import subprocess
 import importlib
 import json
+import html
 import configparser
+import fnmatch
+import gzip
+import zlib
+import hashlib
+import functools
 from multiprocessing import Pool, cpu_count
 import itertools
+import operator
+from bisect import bisect_right
 from pathlib import Path
 
 # --- Core Libraries ---
@@ -15,6 +23,14 @@ try:
     from PyPDF2 import PdfReader
 except ImportError:
     PdfReader = None
+try:
+    import fitz # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 try:
     from tqdm import tqdm
 except ImportError:
@@ -23,14 +39,27 @@ try:
     from colorama import init, Fore, Style
 except ImportError:
     Fore, Style = None, None
-try:
-    from docx import Document as DocxDocument
-except ImportError:
-    DocxDocument = None
 try:
     from thefuzz import fuzz
 except ImportError:
     fuzz = None
+try:
+    # Installed alongside thefuzz; process.extractOne scores a whole line's words in C++
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:
+    rapid_fuzz, rapid_process = None, None
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+try:
+    import re2
+except ImportError:
+    re2 = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Setup and Requirement Checking ---
 REQUIRED_LIBRARIES = {
@@ -40,6 +69,28 @@ REQUIRED_LIBRARIES = {
     "thefuzz": "thefuzz"
 }
 
+# Splits a line into the words that fuzzy search scores
+FUZZY_TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# RE2's \w, \b, \d and \s only cover ASCII, it reads [[:alpha:]] as a POSIX class,
+# {,n} as literal text, and its (?i) does not pair 'i' with 'İ' or 'ı'; patterns
+# using these keep Python's meaning on re
+RE2_INCOMPATIBLE_PATTERN = re.compile(r'\\[wWbBdDsS]|\[:|\{,|\(\?[a-zA-Z-]*i')
+
+# Documents whose text, with leading and trailing whitespace stripped, is shorter
+# than this are reported as scanned
+SCANNED_TEXT_THRESHOLD = 50
+# Without PyMuPDF, PDFs with more pages than this are sampled before full extraction
+PDF_SAMPLE_PAGES = 5
+
+# Extracted PDF/DOCX text is cached here, keyed by path, modification time and size,
+# the extraction backend and the extraction rules
+CACHE_DIR = Path.home() / ".cache" / "nerd-search"
+# Bump whenever extraction output changes, so entries made by older rules are dropped
+CACHE_FORMAT_VERSION = 3
+# Least recently used entries are deleted once the cache grows past this
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
 CONFIG_FILE_NAME = ".nerdsearchrc"
 CONFIG_DEFAULTS = {
     'general': {
@@ -101,6 +152,7 @@ if Fore and Style:
 else:
     ANSI_HIGHLIGHT_COLOR = ''
     ANSI_RESET_COLOR = ''
+ANSI_HIGHLIGHT_TEMPLATE = f"{ANSI_HIGHLIGHT_COLOR}\\g<0>{ANSI_RESET_COLOR}"
 
 # --- CSS and HTML for HTML export ---
 HTML_STYLES = """
@@ -122,12 +174,12 @@ h1, h2 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;
 .quiet-list li { background-color: #eafaf1; padding: 8px; margin-bottom: 5px; list-style-type: none; border-radius: 4px; }
 </style>
 """
+# Matches are marked with control characters, which survive html.escape() and then become the span tags
+HTML_HIGHLIGHT_TEMPLATE = "\x00\\g<0>\x01"
+HTML_HEADER = f'<html><head><title>Nerd-Search Results</title>{HTML_STYLES}</head><body><div class="container"><h1>Nerd-Search Results</h1>'
+HTML_FOOTER = '</div></body></html>'
 
 # --- Utility Functions ---
-def strip_ansi_codes(text):
-    """Removes ANSI escape codes from a string."""
-    return re.sub(r'\x1b$$[0-9;]*m', '', text)
-
 def load_config():
     """Loads configuration from a .nerdsearchrc file."""
     config = configparser.ConfigParser()
@@ -147,215 +199,572 @@ def load_config():
         config.read(config_path)
     return config
 
+def compile_exclude_patterns(exclude_patterns):
+    """Compiles --exclude patterns into a list of case-insensitive regexes.
+
+    Each pattern is a regular expression; one that isn't valid as a regex,
+    such as the glob "*draft*", is matched as a filename glob instead.
+    """
+    compiled = []
+    for pattern in exclude_patterns or []:
+        try:
+            compiled.append(re.compile(pattern, re.IGNORECASE))
+        except re.error:
+            compiled.append(re.compile(r'\A' + fnmatch.translate(pattern), re.IGNORECASE))
+    # Group-free patterns are fused into one alternation so each name is tested once.
+    # Patterns with groups stay separate (joining would renumber backreferences), and
+    # inline global flags like "(?i)" can't be joined, so then nothing is fused.
+    fusable = [regex for regex in compiled if not regex.groups]
+    if len(fusable) > 1:
+        try:
+            fused = re.compile("|".join(f"(?:{regex.pattern})" for regex in fusable), re.IGNORECASE)
+        except re.error:
+            pass
+        else:
+            compiled = [fused] + [regex for regex in compiled if regex.groups]
+    return compiled
+
 def find_documents(directory, recursive, exclude_patterns):
     """Generates a list of document paths, respecting exclusion and recursion options."""
     doc_files = []
     extensions = ('.pdf', '.txt', '.docx')
-    if recursive:
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                if filename.lower().endswith(extensions):
-                    file_path = os.path.join(root, filename)
-                    if not any(re.search(pattern, filename, re.IGNORECASE) for pattern in exclude_patterns):
-                        doc_files.append(file_path)
-    else:
-        for filename in os.listdir(directory):
-            if filename.lower().endswith(extensions):
-                file_path = os.path.join(directory, filename)
-                if not any(re.search(pattern, filename, re.IGNORECASE) for pattern in exclude_patterns):
-                    doc_files.append(file_path)
+    exclude_regexes = compile_exclude_patterns(exclude_patterns)
+    # scandir hands back cached entry types, so no extra stat() per file
+    pending_dirs = [directory]
+    while pending_dirs:
+        try:
+            entries = os.scandir(pending_dirs.pop())
+        except OSError:
+            continue # Unreadable subfolder, skipped like os.walk does
+        with entries:
+            for entry in entries:
+                if recursive and entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    if not any(regex.search(entry.name) for regex in exclude_regexes):
+                        doc_files.append(entry.path)
     return doc_files
 
+def open_pdf(file_path):
+    """Opens a PDF with the fastest available backend.
+
+    Returns (page_count, page_text, close), where page_text(index) extracts the
+    text of a single page.
+    """
+    if fitz:
+        doc = fitz.open(file_path)
+        def page_text(index):
+            page = doc[index]
+            # Text needs a font; listing fonts (including those of form XObjects)
+            # is far cheaper than extraction, so image-only pages skip it
+            if not page.get_fonts(full=True):
+                return ""
+            text = page.get_text("text")
+            # MuPDF ends every line, including the page's last, with a newline; drop
+            # that one so line numbers and context match PyPDF2 and PDFium
+            return text[:-1] if text.endswith('\n') else text
+        return doc.page_count, page_text, doc.close
+    if pdfium:
+        pdf = pdfium.PdfDocument(file_path)
+        def page_text(index):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            # PDFium separates lines with CRLF; normalize so line numbers match PyPDF2
+            text = textpage.get_text_range().replace('\r\n', '\n')
+            textpage.close()
+            page.close()
+            return text
+        return len(pdf), page_text, pdf.close
+    reader = PdfReader(file_path)
+    def page_text(index):
+        page = reader.pages[index]
+        # Blank/divider pages have no content stream, so skip font decoding entirely
+        if "/Contents" not in page:
+            return ""
+        return page.extract_text() or ""
+    return len(reader.pages), page_text, reader.stream.close
+
+def extract_pdf_pages(file_path):
+    """Returns the text of each PDF page.
+
+    Without PyMuPDF, pages spread across the document are sampled first; if they
+    contain no text the document is treated as scanned and only the samples are
+    returned, so text that only appears on unsampled pages is missed. PyMuPDF
+    skips image-only pages cheaply, so there every page is checked.
+    """
+    page_count, page_text, close = open_pdf(file_path)
+    try:
+        sample_indexes = sorted({0, page_count // 4, page_count // 2, 3 * page_count // 4, page_count - 1}) if page_count > PDF_SAMPLE_PAGES and not fitz else []
+        sampled = {index: page_text(index) for index in sample_indexes}
+        if sampled and sum(len(text.strip()) for text in sampled.values()) < SCANNED_TEXT_THRESHOLD:
+            return list(sampled.values())
+        return [sampled[index] if index in sampled else page_text(index) for index in range(page_count)]
+    finally:
+        close()
+
 def extract_text_from_file(file_path):
-    """Extracts text from a PDF, TXT, or DOCX file."""
+    """Extracts the text of each page from a PDF, TXT, or DOCX file.
+
+    Non-PDF files are returned as a single page. On failure an error message
+    string is returned instead of a list.
+    """
     try:
         if file_path.lower().endswith('.pdf'):
-            if not PdfReader: raise ImportError("PyPDF2 is not installed.")
-            reader = PdfReader(file_path)
-            return "\n".join([page.extract_text() or "" for page in reader.pages])
+            if not (fitz or pdfium or PdfReader): raise ImportError("PyPDF2 is not installed.")
+            return extract_pdf_pages(file_path)
         elif file_path.lower().endswith('.txt'):
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+                return [f.read()]
         elif file_path.lower().endswith('.docx'):
-            if not DocxDocument: raise ImportError("python-docx is not installed.")
+            # Imported on first use: python-docx loads lxml, which runs without .docx files never need
+            try:
+                from docx import Document as DocxDocument
+            except ImportError:
+                raise ImportError("python-docx is not installed.")
             doc = DocxDocument(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
+            return ["\n".join([para.text for para in doc.paragraphs])]
     except Exception as e:
         return f"Could not read or process file. Reason: {e}"
-    return "" # Should not be reached
+    return [] # Should not be reached
+
+def pdf_backend_name():
+    """Returns the name of the backend open_pdf() uses."""
+    return "pymupdf" if fitz else "pdfium" if pdfium else "pypdf2"
+
+def cache_path_for(file_path):
+    """Returns the cache file for the current version of a document."""
+    stat = os.stat(file_path)
+    # Backends differ in line breaks and spacing, so text from one is never served for another
+    backend = pdf_backend_name() if file_path.lower().endswith('.pdf') else "python-docx"
+    key = f"{backend}|{SCANNED_TEXT_THRESHOLD}|{PDF_SAMPLE_PAGES}|{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return CACHE_DIR / f"v{CACHE_FORMAT_VERSION}-{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json.gz"
+
+def prune_cache():
+    """Deletes cache entries from other format versions, then the least recently used
+    entries until the cache fits in CACHE_MAX_BYTES."""
+    entries = []
+    try:
+        with os.scandir(CACHE_DIR) as scan:
+            for entry in scan:
+                try:
+                    if not entry.name.startswith(f"v{CACHE_FORMAT_VERSION}-"):
+                        os.remove(entry.path)
+                    else:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    pass # Removed by a concurrent run
+    except OSError:
+        return # No cache yet
+    total_size = sum(size for _, size, _ in entries)
+    # Hits refresh an entry's mtime, so stale entries for changed or deleted files go first
+    for _, size, path in sorted(entries):
+        if total_size <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+def extract_text_cached(file_path):
+    """Extracts page text, reusing the cached extraction of an unchanged PDF or DOCX."""
+    if file_path.lower().endswith('.txt'):
+        # Plain text is as cheap to read as a cache entry
+        return extract_text_from_file(file_path)
+    try:
+        cache_path = cache_path_for(file_path)
+    except OSError:
+        return extract_text_from_file(file_path)
+    try:
+        with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+            pages = json.load(f)
+    except (OSError, EOFError, zlib.error, json.JSONDecodeError, ValueError):
+        pass # Missing or corrupt entry; extract again
+    else:
+        try:
+            os.utime(cache_path) # Mark as recently used for prune_cache()
+        except OSError:
+            pass
+        return pages
+
+    pages = extract_text_from_file(file_path)
+    if isinstance(pages, str):
+        return pages # Don't cache failures
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so parallel workers never read a partial entry
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            # Text compresses several-fold; a low level keeps writes cheap
+            with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=3) as f:
+                json.dump(pages, f)
+            os.replace(temp_path, cache_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink() # Failed write, don't leave a partial entry behind
+    except (OSError, ValueError):
+        pass # Caching is best-effort; e.g. lone surrogates from PDF text can't be encoded
+    return pages
 
 # --- Core Search Logic (for multiprocessing) ---
-def search_single_file(args_tuple):
+def is_word_char(char):
+    """Mirrors the regex \\w class for a single character."""
+    return char.isalnum() or char == '_'
+
+def is_ascii(text):
+    """Returns True if text is pure ASCII, like str.isascii(), which Python 3.6 lacks."""
+    try:
+        text.encode("ascii")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def line_start_offsets(lines):
+    """Returns the offset at which each line starts in the newline-joined text."""
+    # Offset of line i is the length of all earlier lines plus i newlines;
+    # accumulate/map keep the whole computation in C.
+    return [0, *map(operator.add, itertools.accumulate(map(len, lines[:-1])), itertools.count(1))]
+
+def build_literal_automaton(search_words, case_sensitive):
+    """Builds an Aho-Corasick automaton over the search words, or None if one can't be used.
+
+    Each key maps to (key_length, [(word_order, word), ...]) so several words
+    that fold to the same key are all reported.
+    """
+    if not ahocorasick:
+        return None
+    # As in find_literal_hits(), lowercased keys only match like re.IGNORECASE for
+    # ASCII; e.g. 'ı' also matches 'I', which lower() can't find
+    if not case_sensitive and not all(is_ascii(word) for word in search_words):
+        return None
+    words_by_key = {}
+    for word_order, word in enumerate(search_words):
+        key = word if case_sensitive else word.lower()
+        if not key:
+            return None
+        words_by_key.setdefault(key, []).append((word_order, word))
+
+    automaton = ahocorasick.Automaton()
+    for key, words in words_by_key.items():
+        automaton.add_word(key, (len(key), words))
+    automaton.make_automaton()
+    return automaton
+
+def find_literal_hits(full_text, line_starts, automaton, case_sensitive, whole_word):
+    """Finds (line_index, word) hits for literal words with a single Aho-Corasick pass.
+
+    Returns None when the automaton cannot reproduce the regex semantics, so the
+    caller falls back to the per-line regex scan.
+    """
+    # Lowercased keys only agree with re.IGNORECASE on ASCII text: it also pairs
+    # characters such as 'µ'/'μ', 'ſ'/'s' or 'ϑ'/'θ' that lower() keeps apart.
+    if not case_sensitive and not is_ascii(full_text):
+        return None
+    text_key = full_text if case_sensitive else full_text.lower()
+
+    text_len = len(full_text)
+    hits = set()
+    for end_index, (key_len, words) in automaton.iter(text_key):
+        start = end_index - key_len + 1
+        if whole_word:
+            # Emulate \b on both sides of the match, as the regex path does
+            before = full_text[start - 1] if start > 0 else ''
+            after = full_text[end_index + 1] if end_index + 1 < text_len else ''
+            if is_word_char(before) == is_word_char(full_text[start]):
+                continue
+            if is_word_char(full_text[end_index]) == is_word_char(after):
+                continue
+        line_index = bisect_right(line_starts, start) - 1
+        for word_order, word in words:
+            hits.add((line_index, word_order, word))
+    return [(line_index, word) for line_index, _, word in sorted(hits)]
+
+def compile_search_patterns(search_words, case_sensitive, whole_word, use_regex):
+    """Compiles one pattern per search word. Raises re.error for an invalid regex."""
+    search_patterns = {}
+    flags = 0 if case_sensitive else re.IGNORECASE
+    for word in search_words:
+        if use_regex:
+            search_patterns[word] = re.compile(word, flags=flags)
+        else:
+            escaped_word = re.escape(word)
+            pattern_str = rf'\b{escaped_word}\b' if whole_word else escaped_word
+            search_patterns[word] = re.compile(pattern_str, flags=flags)
+    return search_patterns
+
+@functools.lru_cache(maxsize=None)
+def compile_user_regex(pattern_str, case_sensitive):
+    """Compiles a case-sensitive user regex with RE2 (linear time) when installed and the pattern means the same there, else with re."""
+    # Case-insensitive matching differs between the engines, so it always uses re
+    if re2 and case_sensitive and not RE2_INCOMPATIBLE_PATTERN.search(pattern_str):
+        try:
+            return re2.compile(pattern_str)
+        except re2.error:
+            pass # Backreferences, lookarounds etc. are not supported by RE2
+    return re.compile(pattern_str, flags=0 if case_sensitive else re.IGNORECASE)
+
+# Settings shared by every file a worker searches, set once per worker by init_worker()
+search_settings = None
+
+def init_worker(settings):
+    """Pool initializer. Stores the compiled patterns and options so tasks only carry a file path."""
+    global search_settings
+    search_settings = settings
+
+def search_single_file(file_path):
     """Searches for words in a single file. This function is designed for multiprocessing."""
-    file_path, search_words, case_sensitive, whole_word, use_regex, fuzzy, fuzzy_threshold, context_lines = args_tuple
+    search_patterns, automaton, case_sensitive, whole_word, use_regex, fuzzy, fuzzy_threshold, context_lines, use_cache = search_settings
     filename = os.path.basename(file_path)
     
-    full_text = extract_text_from_file(file_path)
-    if "Could not read or process file" in full_text:
-        return {filename: full_text}
+    pages = extract_text_cached(file_path) if use_cache else extract_text_from_file(file_path)
+    if isinstance(pages, str):
+        return {filename: pages}
+    full_text = "\n".join(pages)
 
-    if len(full_text.strip()) < 50:
+    # Line index at which each page starts, used to report page numbers
+    page_starts = [0]
+    for page_text in pages[:-1]:
+        page_starts.append(page_starts[-1] + page_text.count('\n') + 1)
+    # The joined text is a second full copy; drop the page list before scanning
+    del pages
+
+    if len(full_text.strip()) < SCANNED_TEXT_THRESHOLD:
         return {filename: {"_is_scanned_": ["This document appears to be empty or a scanned image and contains no extractable text."]}}
         
     lines = full_text.split('\n')
     
-    search_patterns = {}
     flags = 0 if case_sensitive else re.IGNORECASE
-    for word in search_words:
-        if use_regex:
-            try:
-                search_patterns[word] = re.compile(word, flags=flags)
-            except re.error as e:
-                return {filename: f"Invalid regular expression for '{word}': {e}"}
+
+    line_starts = line_start_offsets(lines)
+
+    hits = None
+    if automaton is not None:
+        hits = find_literal_hits(full_text, line_starts, automaton, case_sensitive, whole_word)
+
+    if hits is None:
+        if use_regex or fuzzy:
+            candidate_lines = range(len(lines))
+            if use_regex and re2 and case_sensitive:
+                # Compiled once per worker; RE2 patterns are not sent through pickle
+                search_patterns = {word: compile_user_regex(word, case_sensitive) for word in search_patterns}
         else:
-            escaped_word = re.escape(word)
-            pattern_str = rf'\b{escaped_word}\b' if whole_word else escaped_word
-            search_patterns[word] = re.compile(pattern_str, flags=flags)
+            # A C-level substring test drops words absent from the whole document.
+            # Ignoring case it is only exact for ASCII: re.IGNORECASE also pairs
+            # characters such as 'ı'/'I', 'ſ'/'s' or 'µ'/'μ' that lower() keeps apart,
+            # so non-ASCII words, or any words in non-ASCII text, are always kept.
+            text_key = None
+            if case_sensitive:
+                search_patterns = {word: pattern for word, pattern in search_patterns.items() if word in full_text}
+            elif is_ascii(full_text):
+                text_key = full_text.lower()
+                search_patterns = {word: pattern for word, pattern in search_patterns.items() if not is_ascii(word) or word.lower() in text_key}
+            if not search_patterns:
+                return {filename: None}
+            # One pass of a combined pattern finds every line holding any word;
+            # literal words never span lines, so no matching line is missed.
+            if text_key is None or not all(is_ascii(word) for word in search_patterns):
+                combined_pattern = re.compile("|".join(f"(?:{pattern.pattern})" for pattern in search_patterns.values()), flags=flags)
+                scan_text = full_text
+            else:
+                # ASCII text and words, lowercased, can be scanned without IGNORECASE,
+                # which lets re use its fast literal search; offsets still line up
+                cores = [re.escape(word.lower()) for word in search_patterns]
+                combined_pattern = re.compile("|".join(rf"(?:\b{core}\b)" if whole_word else f"(?:{core})" for core in cores))
+                scan_text = text_key
+            candidate_lines = sorted({bisect_right(line_starts, match.start()) - 1 for match in combined_pattern.finditer(scan_text)})
 
+        if fuzzy:
+            # Scores compare lowercase forms; lower the search words once, not per token
+            lower_words = {word: word.lower() for word in search_patterns}
+            # Any token other than the word itself scores at most 200m/(2m+1) against an
+            # m-character word, which rounds below 100 while m < 100; from threshold 100
+            # up, only an identical token can match those words and scoring is skipped
+            scored_words = {word for word, lower_word in lower_words.items() if fuzzy_threshold < 100 or len(lower_word) >= 100}
+
+        hits = []
+        for line_index in candidate_lines:
+            line = lines[line_index]
+            line_words = None
+            for word, pattern in search_patterns.items():
+                if fuzzy:
+                    # For fuzzy search, we iterate through words in the line,
+                    # tokenized and lowered once and shared by every search word
+                    if line_words is None:
+                        line_words = [line_word.lower() for line_word in FUZZY_TOKEN_PATTERN.findall(line)]
+                    if lower_words[word] in line_words:
+                        # An identical token scores 100, so the other tokens needn't be scored
+                        if fuzzy_threshold <= 100:
+                            hits.append((line_index, word))
+                    elif word in scored_words:
+                        if rapid_process:
+                            # thefuzz reports round(score), so compare the best raw score the same
+                            # way; the cutoff only lets RapidFuzz skip hopeless tokens early and
+                            # is clamped to the 0-100 range RapidFuzz accepts
+                            cutoff = max(0, min(100, fuzzy_threshold - 0.5))
+                            best = rapid_process.extractOne(lower_words[word], line_words, scorer=rapid_fuzz.ratio, score_cutoff=cutoff)
+                            if best and round(best[1]) >= fuzzy_threshold:
+                                hits.append((line_index, word))
+                        elif any(fuzz.ratio(lower_words[word], line_word) >= fuzzy_threshold for line_word in line_words):
+                            hits.append((line_index, word))
+                elif pattern.search(line):
+                    hits.append((line_index, word))
+
+    # hits holds each (line, word) pair once, in line order, so the match
+    # lists below are deduplicated and sorted by construction
     found_in_file = {}
-    for line_index, line in enumerate(lines):
-        for word, pattern in search_patterns.items():
-            matches = []
-            if fuzzy:
-                # For fuzzy search, we iterate through words in the line
-                line_words = re.findall(r'\b\w+\b', line)
-                for i, line_word in enumerate(line_words):
-                    ratio = fuzz.ratio(word.lower(), line_word.lower())
-                    if ratio >= fuzzy_threshold:
-                        start_pos = line.find(line_word)
-                        if start_pos != -1:
-                            matches.append((start_pos, start_pos + len(line_word)))
-            else:
-                for match in pattern.finditer(line):
-                    matches.append((match.start(), match.end()))
-
-            if matches:
-                if word not in found_in_file:
-                    found_in_file[word] = []
-                
-                # Determine page number (approximate for non-PDFs)
-                page_num = 1 # Default
-                if PdfReader and file_path.lower().endswith('.pdf'):
-                    try:
-                        reader = PdfReader(file_path)
-                        lines_per_page = len(full_text.split('\n')) / len(reader.pages)
-                        page_num = int(line_index / lines_per_page) + 1
-                    except: # Fallback if PDF reading fails
-                        page_num = 1
+    # Several words can hit the same line; build its entry once and share it,
+    # which also lets pickle send the context string back only once.
+    line_entries = {}
+    for line_index, word in hits:
+        if word not in found_in_file:
+            found_in_file[word] = []
 
+        if line_index not in line_entries:
+            # Determine page number (always 1 for non-PDFs)
+            page_num = bisect_right(page_starts, line_index)
+
+            if context_lines is None:
+                # No context is requested when the output never displays it
+                context = ""
+            else:
                 # Get context
                 start_idx = max(0, line_index - context_lines)
                 end_idx = min(len(lines), line_index + context_lines + 1)
-                context = lines[start_idx:end_idx]
-                
+                context_block = lines[start_idx:end_idx]
+
                 # Highlight the match line
                 match_line_index = line_index - start_idx
-                context[match_line_index] = f">>> {context[match_line_index]}"
-                
-                found_in_file[word].append((page_num, line_index + 1, "\n".join(context)))
+                context_block[match_line_index] = f">>> {context_block[match_line_index]}"
+                context = "\n".join(context_block)
+
+            line_entries[line_index] = (page_num, line_index + 1, context)
+
+        found_in_file[word].append(line_entries[line_index])
 
     return {filename: found_in_file if found_in_file else None}
 
 # --- Output Formatters ---
-def highlight_word_in_text(text, word, use_regex, for_html=False):
-    """Highlights a word in text, either with ANSI codes or HTML span."""
+def compile_highlight_patterns(search_words):
+    """Compiles one case-insensitive highlight pattern per search word."""
+    return {word: re.compile(re.escape(word), re.IGNORECASE) for word in search_words}
+
+def highlight_word_in_text(text, pattern, use_regex, for_html=False):
+    """Highlights a word in text, either with ANSI codes or HTML span. HTML output is also escaped."""
+    if for_html:
+        text = text.replace("\x00", "").replace("\x01", "") # Not valid in HTML; would clash with the marks
+        if not use_regex:
+            text = pattern.sub(HTML_HIGHLIGHT_TEMPLATE, text)
+        # Escape once, after matching, so search words still match text like '&' or '<'
+        return html.escape(text, quote=False).replace("\x00", '<span class="highlight">').replace("\x01", "</span>")
     if use_regex:
         return text
-    escaped_word = re.escape(word)
-    if for_html:
-        return re.sub(rf'({escaped_word})', r'<span class="highlight">\1</span>', text, flags=re.IGNORECASE)
-    else:
-        return re.sub(rf'({escaped_word})', lambda match: f"{ANSI_HIGHLIGHT_COLOR}{match.group(1)}{ANSI_RESET_COLOR}", text, flags=re.IGNORECASE)
+    # Template substitution runs entirely in C, with no Python callback per match
+    return pattern.sub(ANSI_HIGHLIGHT_TEMPLATE, text)
+
+def format_file_for_console(filename, file_data, search_words, quiet_mode, use_regex, filter_no_results, highlight_patterns=None):
+    """Formats one file's results as console lines. Highlighting is skipped when highlight_patterns is None."""
+    if quiet_mode:
+        return [filename] if file_data and not isinstance(file_data, str) and "_is_scanned_" not in file_data else []
+    if filter_no_results and (file_data is None or isinstance(file_data, str) or "_is_scanned_" in file_data):
+        return []
+
+    output_lines = [f"\n📄 Found in: {filename}"]
+    
+    if isinstance(file_data, str):
+        output_lines.append(f" [!] {file_data}")
+        return output_lines
+    if not file_data:
+        return output_lines
+    if "_is_scanned_" in file_data:
+        output_lines.append(f" [!] {file_data['_is_scanned_'][0]}")
+        return output_lines
+
+    total_occurrences = sum(len(matches) for matches in file_data.values())
+    unique_words_found = len(file_data)
+    output_lines.append(f" -> Total: {total_occurrences} occurrences of {unique_words_found} unique words.")
+
+    for word in search_words:
+        if word in file_data:
+            matches = file_data[word]
+            count = len(matches)
+            output_lines.append(f"\n - Word: '{word}' (Found {count} times)")
+            # Matches are already unique per line and in document order
+            for page, line, context in matches:
+                output_lines.append(f" > Page {page}, Line {line}:")
+                if highlight_patterns:
+                    context = highlight_word_in_text(context, highlight_patterns[word], use_regex, for_html=False)
+                output_lines.append(f" {context}")
+                output_lines.append("-" * 20)
+    return output_lines
 
-def format_results_for_console(results, search_words, quiet_mode, use_regex, filter_no_results):
-    """Formats results for console output with ANSI highlighting."""
+def format_results_for_console(results, search_words, quiet_mode, use_regex, filter_no_results, highlight=True):
+    """Formats results for console output, with ANSI highlighting unless highlight is False."""
     if quiet_mode:
         output_lines = [filename for filename, data in results.items() if data and not isinstance(data, str) and "_is_scanned_" not in data]
         return "\n".join(output_lines)
 
+    highlight_patterns = compile_highlight_patterns(search_words) if highlight else None
     output_lines = ["===== SEARCH RESULTS ====="]
     if not any(results.values()):
         output_lines.append("No matching words found in any files.")
     else:
         for filename, file_data in results.items():
-            if filter_no_results and (file_data is None or isinstance(file_data, str) or "_is_scanned_" in file_data):
-                continue
-            
-            output_lines.append(f"\n📄 Found in: {filename}")
-            
-            if isinstance(file_data, str):
-                output_lines.append(f" [!] {file_data}")
-                continue
-            if "_is_scanned_" in file_data:
-                output_lines.append(f" [!] {file_data['_is_scanned_'][0]}")
-                continue
-            if not file_data:
-                continue
-
-            total_occurrences = sum(len(matches) for matches in file_data.values())
-            unique_words_found = len(file_data)
-            output_lines.append(f" -> Total: {total_occurrences} occurrences of {unique_words_found} unique words.")
-
-            for word in search_words:
-                if word in file_data:
-                    matches = file_data[word]
-                    count = len(matches)
-                    output_lines.append(f"\n - Word: '{word}' (Found {count} times)")
-                    # Use set to remove duplicate context blocks if a word appears twice in one context
-                    for page, line, context in sorted(list(set(matches)), key=lambda x: (x[0], x[1])):
-                        output_lines.append(f" > Page {page}, Line {line}:")
-                        highlighted_context = highlight_word_in_text(context, word, use_regex, for_html=False)
-                        output_lines.append(f" {highlighted_context}")
-                        output_lines.append("-" * 20)
+            output_lines.extend(format_file_for_console(filename, file_data, search_words, quiet_mode, use_regex, filter_no_results, highlight_patterns))
     output_lines.append("========================\n")
     return "\n".join(output_lines)
 
+def format_file_for_html(filename, file_data, search_words, use_regex, filter_no_results, base_url, highlight_patterns):
+    """Formats one file's results as a list of HTML fragments."""
+    if filter_no_results and (file_data is None or isinstance(file_data, str) or "_is_scanned_" in file_data):
+        return []
+
+    html_parts = ['<div class="file-section">']
+    if isinstance(file_data, str) or not file_data or "_is_scanned_" in file_data:
+        status = "error" if isinstance(file_data, str) else "skipped"
+        message = file_data if isinstance(file_data, str) else (file_data or {}).get("_is_scanned_", ["No matches found."])[0]
+        html_parts.append(f'<p class="{status}">File: {html.escape(filename)} - {html.escape(message)}</p>')
+        html_parts.append('</div>')
+        return html_parts
+
+    if base_url:
+        if not base_url.endswith('/'): base_url += '/'
+        file_url = html.escape(f'{base_url}{filename}')
+        html_parts.append(f'<div class="file-title">📄 <a href="{file_url}" target="_blank">{html.escape(filename)}</a></div>')
+    else:
+        html_parts.append(f'<div class="file-title">📄 {html.escape(filename)}</div>')
+
+    total_occurrences = sum(len(matches) for matches in file_data.values())
+    unique_words_found = len(file_data)
+    html_parts.append(f'<div class="file-summary">Total: {total_occurrences} occurrences of {unique_words_found} unique words.</div>')
+
+    for word in search_words:
+        if word in file_data:
+            matches = file_data[word]
+            count = len(matches)
+            html_parts.append(f'<div class="word-section">')
+            html_parts.append(f'<div class="word-title">Word: \'{html.escape(word)}\' (Found {count} times)</div>')
+            for page, line, context in matches:
+                html_parts.append('<div class="match">')
+                html_parts.append(f'<strong>Page {page}, Line {line}:</strong>')
+                highlighted_context = highlight_word_in_text(context, highlight_patterns[word], use_regex, for_html=True)
+                html_parts.append(f'<div class="match-details">{highlighted_context}</div>')
+                html_parts.append('</div>')
+            html_parts.append('</div>')
+    html_parts.append('</div>')
+    return html_parts
+
 def format_results_for_html(results, search_words, quiet_mode, use_regex, filter_no_results, base_url):
     """Formats results for HTML output with CSS highlighting."""
-    html_parts = [f"<html><head><title>Nerd-Search Results</title>{HTML_STYLES}</head><body>"]
-    html_parts.append('<div class="container"><h1>Nerd-Search Results</h1>')
+    html_parts = [HTML_HEADER]
+    highlight_patterns = compile_highlight_patterns(search_words)
 
     if not any(results.values()):
         html_parts.append("<p>No matching words found in any files.</p>")
     else:
         for filename, file_data in results.items():
-            if filter_no_results and (file_data is None or isinstance(file_data, str) or "_is_scanned_" in file_data):
-                continue
-            
-            html_parts.append('<div class="file-section">')
-            if isinstance(file_data, str) or not file_data or "_is_scanned_" in file_data:
-                status = "error" if isinstance(file_data, str) else "skipped"
-                message = file_data if isinstance(file_data, str) else file_data.get("_is_scanned_", ["No matches found."])[0]
-                html_parts.append(f'<p class="{status}">File: {filename} - {message}</p>')
-                html_parts.append('</div>')
-                continue
-
-            if base_url:
-                if not base_url.endswith('/'): base_url += '/'
-                file_url = f'{base_url}{filename}'
-                html_parts.append(f'<div class="file-title">📄 <a href="{file_url}" target="_blank">{filename}</a></div>')
-            else:
-                html_parts.append(f'<div class="file-title">📄 {filename}</div>')
-
-            total_occurrences = sum(len(matches) for matches in file_data.values())
-            unique_words_found = len(file_data)
-            html_parts.append(f'<div class="file-summary">Total: {total_occurrences} occurrences of {unique_words_found} unique words.</div>')
-
-            for word in search_words:
-                if word in file_data:
-                    matches = file_data[word]
-                    count = len(matches)
-                    html_parts.append(f'<div class="word-section">')
-                    html_parts.append(f'<div class="word-title">Word: \'{word}\' (Found {count} times)</div>')
-                    for page, line, context in sorted(list(set(matches)), key=lambda x: (x[0], x[1])):
-                        html_parts.append('<div class="match">')
-                        html_parts.append(f'<strong>Page {page}, Line {line}:</strong>')
-                        highlighted_context = highlight_word_in_text(context, word, use_regex, for_html=True)
-                        html_parts.append(f'<div class="match-details">{highlighted_context}</div>')
-                        html_parts.append('</div>')
-                    html_parts.append('</div>')
-            html_parts.append('</div>')
-    html_parts.append('</div></body></html>')
+            html_parts.extend(format_file_for_html(filename, file_data, search_words, use_regex, filter_no_results, base_url, highlight_patterns))
+    html_parts.append(HTML_FOOTER)
     return "".join(html_parts)
 
 def format_results_for_json(results):
@@ -367,20 +776,28 @@ def format_results_for_json(results):
         elif isinstance(data, dict) and "_is_scanned_" in data:
             serializable_results[filename] = {"skipped": data["_is_scanned_"][0]}
         elif data:
-            # Convert tuples to lists for JSON compatibility
-            serializable_data = {}
-            for word, matches in data.items():
-                serializable_data[word] = [list(match) for match in matches]
-            serializable_results[filename] = serializable_data
+            # Match tuples are written as JSON arrays as they are, no copy needed
+            serializable_results[filename] = data
         else:
             serializable_results[filename] = None # Represents no matches
             
+    if orjson:
+        # C-implemented encoder, several times faster on large result sets
+        try:
+            return orjson.dumps(serializable_results, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except orjson.JSONEncodeError:
+            pass # e.g. lone surrogates from PDF text, which json escapes instead
     return json.dumps(serializable_results, indent=4)
 
 
 # --- Main Execution ---
-def run_search(target_path, args):
-    """Main function to orchestrate the search using multiprocessing."""
+def run_search(target_path, args, result_handler=None):
+    """Main function to orchestrate the search using multiprocessing.
+
+    Returns a dict of results, or an error string. If result_handler is given it
+    is called with (filename, file_data) as each file completes, and results are
+    not collected.
+    """
     doc_files_to_process = []
     if os.path.isfile(target_path):
         if target_path.lower().endswith(('.pdf', '.txt', '.docx')):
@@ -397,6 +814,16 @@ def run_search(target_path, args):
     if not doc_files_to_process:
         return "No documents found to search."
 
+    # Compile once here rather than once per file in every worker
+    try:
+        search_patterns = compile_search_patterns(args.words, args.case_sensitive, args.whole_word, args.regex)
+    except re.error as e:
+        return f"Error: Invalid regular expression '{e.pattern}': {e}"
+    # Plain word searches can be served by one automaton, built once for all files
+    automaton = None
+    if not args.regex and not args.fuzzy:
+        automaton = build_literal_automaton(list(search_patterns), args.case_sensitive)
+
     # --- MODIFIED WORKER LOGIC ---
     cpu_cores = cpu_count()
     # Determine the number of workers to use
@@ -411,28 +838,104 @@ def run_search(target_path, args):
         num_workers = args.workers
         if num_workers > cpu_cores:
             print(f"[Warning] You specified {num_workers} workers, but your system only has {cpu_cores} CPU cores. Using more than {cpu_cores} may slow down the search.")
-    
+
+    # Each file is one task, so workers beyond the file count would only sit idle
+    num_workers = min(num_workers, len(doc_files_to_process))
+
     # Prepare arguments for the multiprocessing pool
-    search_args = [
-        (file_path, args.words, args.case_sensitive, args.whole_word, args.regex, args.fuzzy, args.fuzzy_threshold, args.context_lines)
-        for file_path in doc_files_to_process
-    ]
+    # Quiet console/text output lists only filenames, so skip building context
+    context_lines = None if args.quiet and not (args.html_output or args.json_output) else args.context_lines
+
+    # Sent to each worker once, instead of pickling the patterns and automaton with every file
+    settings = (search_patterns, automaton, args.case_sensitive, args.whole_word, args.regex, args.fuzzy, args.fuzzy_threshold, context_lines, not args.no_cache)
 
     final_results = {}
     
     print(f"Processing {len(doc_files_to_process)} files using {num_workers} worker(s)...")
 
-    with Pool(processes=num_workers) as pool:
+    with Pool(processes=num_workers, initializer=init_worker, initargs=(settings,)) as pool:
         # Use tqdm to show progress over the imap_unordered results
-        results_iterator = pool.imap_unordered(search_single_file, search_args)
+        # Hand out files in batches to cut per-task IPC on folders of many small files,
+        # while keeping about four batches per worker for load balancing
+        chunksize = max(1, len(doc_files_to_process) // (num_workers * 4))
+        results_iterator = pool.imap_unordered(search_single_file, doc_files_to_process, chunksize=chunksize)
         if tqdm:
-            results_iterator = tqdm(results_iterator, total=len(doc_files_to_process), desc="Searching Files", unit="file")
+            # Redraw at most twice a second so fast, small files don't pay for terminal writes
+            results_iterator = tqdm(results_iterator, total=len(doc_files_to_process), desc="Searching Files", unit="file",
+                                    mininterval=0.5, miniters=max(1, len(doc_files_to_process) // 200))
         
         for result_dict in results_iterator:
-            final_results.update(result_dict)
+            if result_handler:
+                for filename, file_data in result_dict.items():
+                    result_handler(filename, file_data)
+            else:
+                final_results.update(result_dict)
+
+    if not args.no_cache:
+        prune_cache()
             
     return final_results
 
+def stream_report(target_path, args, output_path, header, format_file, no_match_notice, footer):
+    """Runs the search, writing each file's formatted result to output_path as it completes.
+
+    format_file(filename, file_data) returns the report text for one file, so only
+    that file's results are held in memory. The report is written to a temporary
+    file beside output_path, which replaces it only once the search succeeds; a
+    failed run leaves an existing file untouched. Returns what run_search returns.
+    """
+    found_any = False
+    # Files without matches are only listed once some file has a result, matching
+    # the in-memory formatters; until then just their names are held
+    pending = []
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(header)
+
+            def write_file_result(filename, file_data):
+                nonlocal found_any
+                if not file_data and not found_any:
+                    pending.append(filename)
+                    return
+                found_any = True
+                for pending_filename in pending:
+                    f.write(format_file(pending_filename, None))
+                pending.clear()
+                f.write(format_file(filename, file_data))
+
+            results_data = run_search(target_path, args, result_handler=write_file_result)
+            if not isinstance(results_data, str):
+                if not found_any:
+                    f.write(no_match_notice)
+                f.write(footer)
+        if not isinstance(results_data, str):
+            os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return results_data
+
+def write_text_report(target_path, args):
+    """Runs the search, streaming the plain-text report to args.output. Returns what run_search returns."""
+    def format_file(filename, file_data):
+        return "".join(f"{line}\n" for line in format_file_for_console(filename, file_data, args.words, args.quiet, args.regex, args.filter_no_results))
+
+    if args.quiet:
+        return stream_report(target_path, args, args.output, "", format_file, "", "")
+    return stream_report(target_path, args, args.output, "===== SEARCH RESULTS =====\n", format_file,
+                         "No matching words found in any files.\n", "========================\n")
+
+def write_html_report(target_path, args):
+    """Runs the search, streaming the HTML report to args.html_output. Returns what run_search returns."""
+    highlight_patterns = compile_highlight_patterns(args.words)
+
+    def format_file(filename, file_data):
+        return "".join(format_file_for_html(filename, file_data, args.words, args.regex, args.filter_no_results, args.base_url, highlight_patterns))
+
+    return stream_report(target_path, args, args.html_output, HTML_HEADER, format_file,
+                         "<p>No matching words found in any files.</p>", HTML_FOOTER)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Nerd-Search: Find words in documents (PDF, TXT, DOCX) with context and advanced options.",
@@ -457,7 +960,7 @@ if __name__ == "__main__":
 
     # File handling options
     parser.add_argument("--recursive", action='store_true', help="Search recursively in subdirectories.")
-    parser.add_argument("--exclude", nargs='*', default=[], help="Exclude files matching these regex patterns.")
+    parser.add_argument("--exclude", nargs='*', default=[], help="Exclude files whose names match these regex (or glob) patterns.")
 
     # Output options
     output_group = parser.add_mutually_exclusive_group()
@@ -477,6 +980,7 @@ if __name__ == "__main__":
         default=None, 
         help="Set the number of parallel worker processes for searching. Defaults to the number of CPU cores for maximum speed."
     )
+    parser.add_argument("--no-cache", action='store_true', help=f"Don't read or write the extracted-text cache in {CACHE_DIR}.")
 
     args = parser.parse_args()
 
@@ -507,7 +1011,18 @@ if __name__ == "__main__":
         sys.exit(1)
         
     print(f"Searching: {args.path}\n")
-    results_data = run_search(args.path, args)
+    if args.output or args.html_output:
+        # Text and HTML reports are written as each file completes rather than held in memory
+        try:
+            results_data = write_text_report(args.path, args) if args.output else write_html_report(args.path, args)
+        except IOError as e:
+            print(f"\n[!] Error writing to output file: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        results_data = run_search(args.path, args)
+    if isinstance(results_data, str):
+        print(results_data, file=sys.stderr)
+        sys.exit(1)
 
     # --- Output Handling ---
     try:
@@ -516,17 +1031,8 @@ if __name__ == "__main__":
             with open(args.json_output, 'w', encoding='utf-8') as f:
                 f.write(json_string)
             print(f"\nResults successfully saved to {args.json_output}")
-        elif args.html_output:
-            html_string = format_results_for_html(results_data, args.words, args.quiet, args.regex, args.filter_no_results, args.base_url)
-            with open(args.html_output, 'w', encoding='utf-8') as f:
-                f.write(html_string)
-            print(f"\nResults successfully saved to {args.html_output}")
-        elif args.output:
-            text_string = format_results_for_console(results_data, args.words, args.quiet, args.regex, args.filter_no_results)
-            clean_text = strip_ansi_codes(text_string)
-            with open(args.output, 'w', encoding='utf-8') as f:
-                f.write(clean_text)
-            print(f"\nResults successfully saved to {args.output}")
+        elif args.html_output or args.output:
+            print(f"\nResults successfully saved to {args.html_output or args.output}")
         else:
             console_string = format_results_for_console(results_data, args.words, args.quiet, args.regex, args.filter_no_results)
             print(console_string)